@@ -1,6 +1,7 @@
 import json
 from io import BytesIO
 from pathlib import Path
+from threading import Lock
 from typing import IO, Union
 
 import boto3
@@ -12,11 +13,28 @@ from xarray import DataArray, Dataset
 
 from pystac import Item
 
+# The default client, and the boto3 default session it was created from
+_S3_CLIENT: tuple[boto3.session.Session, BaseClient] | None = None
+_S3_CLIENT_LOCK = Lock()
+
+
+def _default_s3_client() -> BaseClient:
+    # Creating a client is slow, and clients are thread safe, so share one.
+    # Creating it isn't thread safe (nor is boto3's default session), so do
+    # that under a lock. If the default session is replaced, e.g. by
+    # boto3.setup_default_session, a new client is created from it.
+    global _S3_CLIENT
+    with _S3_CLIENT_LOCK:
+        if _S3_CLIENT is None or _S3_CLIENT[0] is not boto3.DEFAULT_SESSION:
+            client = boto3.client("s3")
+            _S3_CLIENT = (boto3.DEFAULT_SESSION, client)
+    return _S3_CLIENT[1]
+
 
 def object_exists(bucket: str, key: str, client: BaseClient | None = None) -> bool:
     """Check if a key exists in a bucket."""
     if client is None:
-        client = boto3.client("s3")
+        client = _default_s3_client()
 
     try:
         client.head_object(Bucket=bucket, Key=key)
@@ -46,7 +64,7 @@ def write_to_s3(
     **kwargs,
 ):
     if client is None:
-        client = boto3.client("s3")
+        client = _default_s3_client()
 
     key = str(path).lstrip("/")
 
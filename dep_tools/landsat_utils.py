@@ -1,6 +1,14 @@
+from functools import cache
+from operator import itemgetter
+import os
+from pathlib import Path
+from tempfile import mkstemp
+from threading import Lock
 from typing import Iterable, Tuple
 
-from geopandas import read_file, GeoDataFrame
+from geopandas import read_file, read_parquet, GeoDataFrame
+import numpy as np
+import pandas as pd
 from odc.algo import erase_bad, mask_cleanup
 from pystac import ItemCollection
 from shapely.geometry import box
@@ -66,14 +74,59 @@ def mask_clouds(
         return xr.where(~mask)
 
 
-def _pathrows():
-    pathrows = GeoDataFrame(
-        read_file(
-            "https://d9-wret.s3.us-west-2.amazonaws.com/assets/palladium/production/s3fs-public/atoms/files/WRS2_descending_0.zip"
-        )
-    )
-    pathrows["geometry"] = pathrows.geometry.apply(fix_winding)
-    return pathrows
+WRS2_URL = "https://d9-wret.s3.us-west-2.amazonaws.com/assets/palladium/production/s3fs-public/atoms/files/WRS2_descending_0.zip"
+WRS2_FILE = Path(__file__).parent / "wrs2_descending.parquet"
+# Used if the package is installed somewhere read only
+WRS2_CACHE_FILE = (
+    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    / "dep_tools"
+    / WRS2_FILE.name
+)
+
+
+_PATHROWS_LOCK = Lock()
+
+
+@cache
+def _pathrows() -> GeoDataFrame:
+    """The WRS2 pathrows. These are downloaded once and saved alongside the
+    package (like the GADM files in :mod:`dep_tools.grids`), or in the user's
+    cache directory if that can't be written to, and only read once per
+    process. Don't modify the returned GeoDataFrame."""
+    # cache doesn't stop concurrent first calls, so make later threads wait
+    # for the first to download (or read) the file
+    with _PATHROWS_LOCK:
+        for file in [WRS2_FILE, WRS2_CACHE_FILE]:
+            if file.exists():
+                # GeoParquet reads several times faster than a GeoPackage
+                return read_parquet(file)
+
+        pathrows = GeoDataFrame(read_file(WRS2_URL))
+        pathrows["geometry"] = pathrows.geometry.apply(fix_winding)
+        for file in [WRS2_FILE, WRS2_CACHE_FILE]:
+            try:
+                _write_atomically(pathrows, file)
+                break
+            except ImportError:
+                # pyarrow isn't installed, so just keep them in memory
+                break
+            except OSError:
+                continue
+        return pathrows
+
+
+def _write_atomically(gdf: GeoDataFrame, file: Path) -> None:
+    """Writes to a temporary file and moves it into place, so other
+    processes never read a partly written file."""
+    file.parent.mkdir(parents=True, exist_ok=True)
+    handle, temp_file = mkstemp(suffix=".parquet", dir=file.parent)
+    try:
+        os.close(handle)
+        gdf.to_parquet(temp_file)
+        os.replace(temp_file, file)
+    except BaseException:
+        Path(temp_file).unlink(missing_ok=True)
+        raise
 
 
 def pathrows_in_area(area: GeoDataFrame, pathrows: GeoDataFrame | None = None):
@@ -81,27 +134,33 @@ def pathrows_in_area(area: GeoDataFrame, pathrows: GeoDataFrame | None = None):
         pathrows = _pathrows()
 
     bbox = bbox_across_180(area)
-    if isinstance(bbox, tuple):
-        return pathrows[
-            pathrows.intersects(box(*bbox[0])) | pathrows.intersects(box(*bbox[1]))
-        ]
-
-    return pathrows[pathrows.intersects(box(*bbox))]
+    bboxes = bbox if isinstance(bbox, tuple) else (bbox,)
+    # The spatial index is built once per GeoDataFrame and cached by geopandas
+    index = pathrows.sindex.query([box(*b) for b in bboxes], predicate="intersects")
+    return pathrows.iloc[np.unique(index[1])]
 
 
 def items_in_pathrows(
     items: ItemCollection, some_pathrows: GeoDataFrame
 ) -> ItemCollection:
+    items = list(items)
+    get_pathrow = itemgetter("landsat:wrs_path", "landsat:wrs_row")
+    # Pull the path and row of every item into an array once, then do the
+    # matching with vectorized operations on path * 1000 + row keys
+    item_pathrows = np.array(
+        [get_pathrow(i.properties) for i in items], dtype=int
+    ).reshape(-1, 2)
+    item_keys = item_pathrows[:, 0] * 1000 + item_pathrows[:, 1]
+    target_keys = pd.unique(
+        some_pathrows["PATH"].astype(int) * 1000 + some_pathrows["ROW"].astype(int)
+    )
+
+    # Position of each item's pathrow in the targets, or -1 if it isn't one.
+    # A stable sort on this keeps items grouped in pathrow order.
+    codes = pd.Categorical(item_keys, categories=target_keys).codes
+    order = np.argsort(codes, kind="stable")
     return ItemCollection(
-        some_pathrows.apply(
-            lambda row: [
-                i
-                for i in items
-                if i.properties["landsat:wrs_path"] == str(row["PATH"]).zfill(3)
-                and i.properties["landsat:wrs_row"] == str(row["ROW"]).zfill(3)
-            ],
-            axis=1,
-        ).sum()
+        (items[j] for j in order[codes[order] >= 0]), clone_items=False
     )
 
 
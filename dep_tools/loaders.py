@@ -1,11 +1,21 @@
 from abc import ABC, abstractmethod
+from math import ceil, isnan, nan, sqrt
+from typing import Hashable, Mapping
+import warnings
+from weakref import WeakValueDictionary
 
+import dask.array as dask_array
+import numpy as np
+from numpy.typing import DTypeLike
 from geopandas import GeoDataFrame
 from odc.geo.geobox import GeoBox
 from odc.geo.geom import Geometry
-from odc.stac import load as stac_load
+from odc.geo.xr import rasterize
+from odc.stac import load as stac_load, output_geobox, parse_items
+import rasterio
 from rasterio.errors import RasterioError, RasterioIOError
 import rioxarray
+from shapely import box, unary_union
 from stackstac import stack
 from xarray import DataArray, Dataset, concat
 
@@ -22,37 +32,213 @@ class Loader(ABC):
 
 
 class StacLoader(Loader):
+    def __init__(self):
+        super().__init__()
+        self._block_shapes = {}
+
     @abstractmethod
     def load(self, items, area):
         pass
 
+    def _block_shape(self, items, asset: str | None = None, patch_url=None):
+        """Returns the internal (y, x) block shape of the given asset (or the
+        first asset, if it isn't one of the item's) of the first item, cached
+        by collection."""
+        item = next(iter(items))
+        if asset not in item.assets:
+            asset = next(iter(item.assets))
+        key = (item.collection_id, asset)
+        if key not in self._block_shapes:
+            href = item.assets[asset].href
+            if patch_url is not None:
+                href = patch_url(href)
+            with rasterio.open(href) as src:
+                self._block_shapes[key] = src.block_shapes[0]
+        return self._block_shapes[key]
+
+
+def align_chunks(chunks: dict, block_shape: tuple[int, int] = (512, 512)) -> dict:
+    """Rounds the x and y values of `chunks` down to a multiple (but at least
+    one) of the given (y, x) block shape, so each block of the source COG is
+    read by exactly one dask chunk."""
+    aligned = dict(chunks)
+    for dim, block in zip(["y", "x"], block_shape):
+        if isinstance(aligned.get(dim), int) and aligned[dim] > 0:
+            aligned[dim] = max(block, (aligned[dim] // block) * block)
+    return aligned
+
+
+def _asset_name(parsed_items: list, band: str) -> str | None:
+    """The name of the asset odc.stac would load `band` (which may be an
+    alias, e.g. "red" for "B04") from, or None if it can't be resolved."""
+    try:
+        return parsed_items[0].collection.band_key(band)[0]
+    except (IndexError, ValueError):
+        return None
+
+
+def _n_times(parsed_items: list, groupby) -> int:
+    """The number of times odc.stac.load would group the items into."""
+    if groupby == "solar_day":
+        return len({item.solar_date for item in parsed_items})
+    if groupby == "time":
+        return len({item.nominal_datetime for item in parsed_items})
+    return len(parsed_items)
+
+
+def _n_load_chunks(
+    shape: tuple[int, int], chunks: dict, n_times: int, n_bands: int
+) -> int:
+    """The number of dask chunks loading `n_bands` bands at `n_times` times
+    onto a grid of the given (y, x) shape with `chunks` would create."""
+    n_chunks = n_bands
+    for dim, size in zip(["time", "y", "x"], [n_times, *shape]):
+        chunk = chunks.get(dim, 1 if dim == "time" else None)
+        if isinstance(chunk, int) and chunk > 0:
+            n_chunks *= ceil(size / chunk)
+    return n_chunks
+
+
+def _n_chunks(xr: Dataset | DataArray) -> int:
+    variables = xr.data_vars.values() if isinstance(xr, Dataset) else [xr]
+    return sum(
+        v.data.npartitions for v in variables if isinstance(v.data, dask_array.Array)
+    )
+
+
+def _capped_chunks(
+    chunks: dict,
+    n_chunks: int,
+    sizes: Mapping[Hashable, int],
+    max_total_chunks: int,
+    block_shape: tuple[int, int] | None = None,
+) -> dict:
+    """Scales up the x and y values of `chunks` (up to the full size of each
+    dimension) so that `n_chunks` would drop to around `max_total_chunks`.
+    If a (y, x) `block_shape` is given, the scaled chunks are rounded up to a
+    multiple of it, as :func:`align_chunks` would have them."""
+    scale = sqrt(n_chunks / max_total_chunks)
+    capped = dict(chunks)
+    for dim, block in zip(["y", "x"], block_shape or (1, 1)):
+        if isinstance(capped.get(dim), int) and capped[dim] > 0:
+            scaled = ceil(ceil(capped[dim] * scale) / block) * block
+            capped[dim] = min(scaled, sizes[dim])
+    return capped
+
 
 class OdcLoader(StacLoader):
     def __init__(
         self,
         load_as_dataset: bool = True,
         clip_to_area: bool = False,
+        align_chunks_to_blocks: bool | tuple[int, int] = False,
+        defer_float_cast: bool = False,
+        max_total_chunks: int = 1_000_000,
         **kwargs,
     ):
         super().__init__()
         self._kwargs = kwargs
         self._clip_to_area = clip_to_area
         self._load_as_dataset = load_as_dataset
+        self._align_chunks_to_blocks = align_chunks_to_blocks
+        self._max_total_chunks = max_total_chunks
+        if defer_float_cast and "dtype" in kwargs:
+            # Load in the native (usually integer) dtype instead, leaving
+            # the cast (and nodata masking, see `load(return_mask=True)`) to
+            # the consumer.
+            self._kwargs["dtype"] = _without_floats(kwargs["dtype"])
+            if self._kwargs["dtype"] is None:
+                del self._kwargs["dtype"]
+        # Decide how to convert the output once, rather than on every load
+        self._convert_output = _as_dataset if load_as_dataset else _as_band_array
 
-    def load(self, items, areas: GeoDataFrame | GeoBox) -> Dataset | DataArray:
-        # If `nodata` is passed as an arg, or the stac item contains the nodata
-        # value, xr[variable].nodata will be set on load.
+    def load(
+        self, items, areas: GeoDataFrame | GeoBox, return_mask: bool = False
+    ) -> Dataset | DataArray | tuple[Dataset | DataArray, Dataset | DataArray]:
+        """Load the given stac items for an area.
 
+        Args:
+            items: The stac items to load.
+            areas: The area to load, or a GeoBox to load onto.
+            return_mask: Whether to also return a boolean mask which is True
+                where the data is valid (see :func:`nodata_mask`). If so, the
+                data is left in its native dtype and, with `clip_to_area`, the
+                area is applied to the mask rather than the data.
+
+        Returns:
+            The data or, if `return_mask` is True, a (data, mask) tuple.
+        """
         load_geometry = (
             dict(geopolygon=areas)
             if isinstance(areas, GeoDataFrame)
             else dict(geobox=areas)
         )
 
+        ds = self._stac_load(items, **load_geometry)
+
+        area = None
+        if self._clip_to_area:
+            if isinstance(areas, GeoBox):
+                raise ValueError(
+                    "Clip not supported for GeoBox (nor should it be needed)"
+                )
+            area = _union(areas)
+
+        return self._output(ds, return_mask, area)
+
+    def load_many(
+        self, items_per_area: list, areas: list[GeoDataFrame], return_mask: bool = False
+    ) -> list:
+        """Load data for several areas, with a single call to odc.stac.load
+        for all the areas that share the same items.
+
+        The union of each such group of areas is loaded once, then cropped to
+        each area. Areas with different items are loaded separately, so the
+        output for each area only has data (and times) from its own items.
+
+        Args:
+            items_per_area: The stac items for each area, e.g. as returned by
+                a :class:`Searcher`.
+            areas: The areas to load.
+            return_mask: As for :meth:`load`.
+
+        Returns:
+            A list containing the output of :meth:`load` for each area, in the
+            same order as `areas`.
+        """
+        groups = dict()
+        for i, items in enumerate(items_per_area):
+            groups.setdefault(frozenset(item.id for item in items), []).append(i)
+
+        outputs = [None] * len(areas)
+        for indices in groups.values():
+            geometries = [_union(areas[i]) for i in indices]
+            crs = geometries[0].crs
+            union = Geometry(
+                unary_union([g.to_crs(crs).geom for g in geometries]), crs=crs
+            )
+            ds = self._stac_load(items_per_area[indices[0]], geopolygon=union)
+
+            # Masking (if any) is left to _output, as it is for load
+            for i, g in zip(indices, geometries):
+                outputs[i] = self._output(
+                    ds.odc.crop(g, apply_mask=False),
+                    return_mask,
+                    g if self._clip_to_area else None,
+                )
+        return outputs
+
+    def _stac_load(self, items, **load_geometry) -> Dataset:
+        # If `nodata` is passed as an arg, or the stac item contains the nodata
+        # value, xr[variable].nodata will be set on load.
+        kwargs = self._kwargs
+        if isinstance(kwargs.get("chunks"), dict):
+            kwargs = dict(kwargs, chunks=self._chunks(items, load_geometry))
+
         ds = stac_load(
             items,
             **load_geometry,
-            **self._kwargs,
+            **kwargs,
         )
 
         for name in ds:
@@ -62,52 +248,214 @@ class OdcLoader(StacLoader):
             if ds[name].dtype.kind == "f":
                 # Should I make this an option?
                 if "nodata" in ds[name].attrs.keys():
-                    ds[name] = ds[name].where(ds[name] != ds[name].nodata, float("nan"))
-                ds[name].attrs["nodata"] = float("nan")
+                    ds[name] = ds[name].where(ds[name] != ds[name].nodata, nan)
+                ds[name].attrs["nodata"] = nan
             # To be helpful, set the nodata for rioxarray accessor
             ds[name].rio.write_nodata(ds[name].attrs.get("nodata"), inplace=True)
 
-        if self._clip_to_area:
-            if isinstance(areas, GeoBox):
-                raise ValueError(
-                    "Clip not supported for GeoBox (nor should it be needed)"
+        return ds
+
+    def _chunks(self, items, load_geometry: dict) -> dict:
+        """The chunks to load `items` with: those given, aligned to the
+        blocks of the source COGs if asked, and enlarged if the load would
+        otherwise create more than `max_total_chunks` dask chunks. Spatial
+        chunks are returned as y and x, which odc.stac takes whatever the
+        crs."""
+        kwargs = self._kwargs
+        bands = kwargs.get("bands")
+        bands = [bands] if isinstance(bands, str) else bands
+        parsed = list(parse_items(items, cfg=kwargs.get("stac_cfg")))
+        # odc.stac builds a task for every chunk up front, so work out the
+        # number of chunks from the output geobox before loading
+        geobox = output_geobox(
+            parsed,
+            bands=bands,
+            **{
+                k: kwargs[k]
+                for k in ["crs", "resolution", "anchor", "align"]
+                if k in kwargs
+            },
+            **load_geometry,
+        )
+        chunks = dict(kwargs["chunks"])
+        if geobox is not None:
+            for dim, yx in zip(geobox.dimensions, ["y", "x"]):
+                if dim != yx and dim in chunks:
+                    chunks[yx] = chunks.pop(dim)
+
+        block_shape = None
+        if self._align_chunks_to_blocks:
+            if isinstance(self._align_chunks_to_blocks, tuple):
+                block_shape = self._align_chunks_to_blocks
+            else:
+                block_shape = self._block_shape(
+                    items,
+                    asset=_asset_name(parsed, bands[0]) if bands else None,
+                    patch_url=kwargs.get("patch_url"),
                 )
+            chunks = align_chunks(chunks, block_shape)
+
+        if geobox is None:
+            return chunks
 
-            geom = Geometry(areas.geometry.unary_union, crs=areas.crs)
-            ds = ds.odc.mask(geom)
+        n_chunks = _n_load_chunks(
+            geobox.shape.yx,
+            chunks,
+            n_times=_n_times(parsed, kwargs.get("groupby", "time")),
+            n_bands=(
+                len(bands)
+                if bands
+                else len({band for item in parsed for band in item.keys()})
+            ),
+        )
+        if n_chunks > self._max_total_chunks:
+            sizes = dict(zip(["y", "x"], geobox.shape.yx))
+            chunks = _capped_chunks(
+                chunks, n_chunks, sizes, self._max_total_chunks, block_shape
+            )
+            warnings.warn(
+                f"Loading would create {n_chunks} dask chunks, increasing chunks to {chunks}"
+            )
+        return chunks
 
-        if not self._load_as_dataset:
-            da = ds.to_array("band").rename("data").rio.write_crs(data.odc.crs)
-            return da
+    def _output(
+        self, ds: Dataset, return_mask: bool, area: Geometry | None = None
+    ) -> Dataset | DataArray | tuple[Dataset | DataArray, Dataset | DataArray]:
+        if return_mask:
+            # Integer data is left as-is; the mask (True where data is valid)
+            # can be applied with `.where(mask)` if and when floats are needed.
+            # Clipping is folded into the mask, since `odc.mask` would cast the
+            # data to float and drop its nodata.
+            mask = nodata_mask(ds)
+            if area is not None:
+                mask = mask & rasterize(area, ds.odc.geobox, all_touched=True)
+            return (
+                self._convert_output(ds, "data"),
+                self._convert_output(mask, "mask"),
+            )
+
+        if area is not None:
+            ds = ds.odc.mask(area)
+
+        return self._convert_output(ds, "data")
+
+
+def _without_floats(dtype: DTypeLike | dict) -> DTypeLike | dict | None:
+    if isinstance(dtype, dict):
+        return {
+            band: band_dtype
+            for band, band_dtype in dtype.items()
+            if np.dtype(band_dtype).kind != "f"
+        } or None
+    return None if np.dtype(dtype).kind == "f" else dtype
+
+
+def _as_dataset(ds: Dataset, name: str) -> Dataset:
+    return ds
+
+
+def _as_band_array(ds: Dataset, name: str) -> DataArray:
+    da = ds.to_array("band").rename(name)
+    # The array is new, so write the crs in place rather than copying again
+    return da.rio.write_crs(ds.odc.crs, inplace=True)
 
-        return ds
+
+def _union(areas: GeoDataFrame) -> Geometry:
+    # shapely's vectorized union works on the whole geometry array at
+    # once rather than pairwise in python
+    return Geometry(unary_union(areas.geometry.values), crs=areas.crs)
+
+
+def _is_rectangular(areas: GeoDataFrame) -> bool:
+    geometry = unary_union(areas.geometry.values)
+    return box(*geometry.bounds).equals(geometry)
+
+
+def nodata_mask(xr: Dataset | DataArray) -> Dataset | DataArray:
+    """Returns a boolean mask which is True where the given data is valid,
+    i.e. not equal to its nodata value and, for floating point data, not nan.
+    """
+    if isinstance(xr, Dataset):
+        return Dataset({name: nodata_mask(xr[name]) for name in xr})
+
+    nodata = xr.attrs.get("nodata", xr.rio.nodata)
+    if nodata is None or isnan(nodata):
+        return xr.notnull()
+    if xr.dtype.kind == "f":
+        return (xr != nodata) & xr.notnull()
+    return xr != nodata
+
+
+def _spatial_chunks(chunksize) -> dict | None:
+    """Returns an int, (y, x) tuple or dict chunksize as a dict, or None if
+    it is something else (e.g. "auto")."""
+    if isinstance(chunksize, int):
+        return dict(y=chunksize, x=chunksize)
+    if isinstance(chunksize, tuple) and len(chunksize) == 2:
+        return dict(y=chunksize[0], x=chunksize[1])
+    if isinstance(chunksize, dict):
+        return chunksize
+    return None
 
 
 class StackStacLoader(StacLoader):
     def __init__(
-        self, stack_kwargs=dict(resolution=30), resamplers_and_assets=None, **kwargs
+        self,
+        stack_kwargs=dict(resolution=30),
+        resamplers_and_assets=None,
+        align_chunks_to_blocks: bool | tuple[int, int] = False,
+        max_total_chunks: int = 1_000_000,
+        share_identical_loads: bool = False,
+        **kwargs,
     ):
         super().__init__(**kwargs)
         self.stack_kwargs = stack_kwargs
         self.resamplers_and_assets = resamplers_and_assets
+        self._align_chunks_to_blocks = align_chunks_to_blocks
+        self._max_total_chunks = max_total_chunks
+        # If set, loads of the same items and area return the same (lazy)
+        # DataArray for as long as an earlier result is still in use, so
+        # downstream computations share a single read of the data. Note
+        # that this means changes to one result are seen by the others.
+        self._share_identical_loads = share_identical_loads
+        self._loads = WeakValueDictionary()
 
-    def load(
-        self,
-        items,
-        areas: GeoDataFrame,
-    ) -> DataArray:
-        areas_proj = areas.to_crs(self._current_epsg)
+    def _stack_block_shape(self, items) -> tuple[int, int] | None:
+        """The block shape to align chunks to, or None if not aligning."""
+        if not self._align_chunks_to_blocks:
+            return None
+        if isinstance(self._align_chunks_to_blocks, tuple):
+            return self._align_chunks_to_blocks
+        assets = (
+            self.resamplers_and_assets[0]["assets"]
+            if self.resamplers_and_assets is not None
+            else self.stack_kwargs.get("assets")
+        )
+        assets = [assets] if isinstance(assets, str) else assets
+        return self._block_shape(items, asset=assets[0] if assets else None)
+
+    def _chunksize(self, block_shape: tuple[int, int] | None):
+        chunksize = _spatial_chunks(self.dask_chunksize)
+        if block_shape is None or chunksize is None:
+            return self.dask_chunksize
+        aligned = align_chunks(chunksize, block_shape)
+        return (aligned["y"], aligned["x"])
+
+    def _stack(self, items, areas_proj: GeoDataFrame, chunksize) -> DataArray:
+        bounds = areas_proj.total_bounds.tolist()
         if self.resamplers_and_assets is not None:
+            # Every stack has the same items and bounds, so skip aligning
+            # and comparing the shared coordinates when combining them
             s = concat(
                 [
                     stack(
                         items,
-                        chunksize=self.dask_chunksize,
+                        chunksize=chunksize,
                         epsg=self._current_epsg,
                         errors_as_nodata=(RasterioError(".*"),),
                         assets=resampler_and_assets["assets"],
                         resampling=resampler_and_assets["resampler"],
-                        bounds=areas_proj.total_bounds.tolist(),
+                        bounds=bounds,
                         band_coords=False,  # needed or some coords are often missing
                         # from qa pixel and we get an error. Make sure it doesn't
                         # mess anything up else where (e.g. rio.crs)
@@ -116,18 +464,81 @@ class StackStacLoader(StacLoader):
                     for resampler_and_assets in self.resamplers_and_assets
                 ],
                 dim="band",
+                join="exact",
+                coords="minimal",
+                compat="override",
+                combine_attrs="override",
             )
         else:
             s = stack(
                 items,
-                chunksize=self.dask_chunksize,
+                chunksize=chunksize,
                 epsg=self._current_epsg,
                 errors_as_nodata=(RasterioIOError(".*"),),
-                **self.stack_kwargs,
+                # Only build the stack over the area, rather than over the
+                # full extent of the items, unless bounds are given
+                **{"bounds": bounds, **self.stack_kwargs},
             )
 
-        return s.rio.write_crs(self._current_epsg).rio.clip(
-            areas_proj.geometry,
-            all_touched=True,
-            from_disk=True,
-        )
+        return s
+
+    def load(
+        self,
+        items,
+        areas: GeoDataFrame,
+    ) -> DataArray:
+        areas_proj = areas.to_crs(self._current_epsg)
+
+        if self._share_identical_loads:
+            key = (
+                tuple(sorted(item.id for item in items)),
+                # The output is clipped to the geometry, not just its bounds
+                unary_union(areas_proj.geometry.values).wkb,
+                self._current_epsg,
+            )
+            s = self._loads.get(key)
+            if s is None:
+                s = self._load(items, areas_proj)
+                self._loads[key] = s
+            return s
+
+        return self._load(items, areas_proj)
+
+    def _load(self, items, areas_proj: GeoDataFrame) -> DataArray:
+        block_shape = self._stack_block_shape(items)
+        chunksize = self._chunksize(block_shape)
+        # Unlike odc.stac, stackstac doesn't build a task per spatial chunk
+        # up front, so the chunks can be counted on the (lazy) stack itself
+        s = self._stack(items, areas_proj, chunksize)
+
+        n_chunks = _n_chunks(s)
+        spatial_chunks = _spatial_chunks(chunksize)
+        if n_chunks > self._max_total_chunks and spatial_chunks is not None:
+            capped = _capped_chunks(
+                spatial_chunks,
+                n_chunks,
+                s.sizes,
+                self._max_total_chunks,
+                block_shape,
+            )
+            chunksize = (capped["y"], capped["x"])
+            warnings.warn(
+                f"Loading would create {n_chunks} dask chunks, increasing chunksize to {chunksize}"
+            )
+            s = self._stack(items, areas_proj, chunksize)
+
+        s.rio.write_crs(self._current_epsg, inplace=True)
+        if _is_rectangular(areas_proj):
+            # Slicing to the bounds is much cheaper than rasterizing the
+            # geometry and gives the same result
+            return s.rio.clip_box(*areas_proj.total_bounds)
+
+        # Trim to the area's extent and rasterize the geometry once against
+        # the trimmed geobox, masking lazily, chunk by chunk. Like rio.clip,
+        # all touched pixels are kept and the rest are set to the nodata
+        # value (nan if there isn't one), keeping the dtype and attrs.
+        area = _union(areas_proj)
+        s = s.odc.crop(area, apply_mask=False)
+        inside = rasterize(area, s.odc.geobox, all_touched=True)
+        nodata = s.rio.nodata
+        return s.where(inside.data, nan if nodata is None else nodata)
@@ -2,6 +2,8 @@ from abc import ABC, abstractmethod
 
 
 class ItemPath(ABC):
+    __slots__ = ()
+
     def __init__(self) -> None:
         pass
 
@@ -11,6 +13,18 @@ class ItemPath(ABC):
 
 
 class GenericItemPath(ItemPath):
+    __slots__ = (
+        "sensor",
+        "dataset_id",
+        "version",
+        "time",
+        "prefix",
+        "zero_pad_numbers",
+        "_folder_prefix",
+        "item_prefix",
+        "_formatted_item_ids",
+    )
+
     def __init__(
         self,
         sensor: str,
@@ -33,6 +47,9 @@ class GenericItemPath(ItemPath):
         self.item_prefix = (
             f"{self.prefix}_{self.sensor}_{self.dataset_id.replace('/','_')}"
         )
+        # path() and friends format the same ids over and over, e.g. once for
+        # each asset of an item
+        self._formatted_item_ids: dict[tuple, str] = {}
 
     def _format_item_id(
         self, item_id: list[str | int] | tuple[str | int] | str, join_str="/"
@@ -40,18 +57,35 @@ class GenericItemPath(ItemPath):
         """Zero pads to 3 characters anything (string or int) that is numeric-like
         and joins list/tuple items or items of a comma-separated string with `join_str`
         """
+        key = (
+            tuple(item_id) if isinstance(item_id, list) else item_id,
+            join_str,
+            self.zero_pad_numbers,
+        )
+        formatted = self._formatted_item_ids.get(key)
+        if formatted is None:
+            formatted = self._formatted_item_ids[key] = self._join_item_id(
+                item_id, join_str
+            )
+        return formatted
+
+    def _join_item_id(
+        self, item_id: list[str | int] | tuple[str | int] | str, join_str: str
+    ) -> str:
         if isinstance(item_id, list | tuple):
             item_parts = item_id
-        elif len(item_id.split(",")) > 1:
+        elif "," in item_id:
             item_parts = item_id.split(",")
+        elif self.zero_pad_numbers and item_id.isdigit():
+            return item_id.zfill(3)
         else:
-            item_parts = [item_id]
+            return item_id
 
-        item_parts = [
-            str(i).zfill(3) if str(i).isnumeric() and self.zero_pad_numbers else str(i)
-            for i in item_parts
-        ]
-        return join_str.join(item_parts)
+        if not self.zero_pad_numbers:
+            return join_str.join(map(str, item_parts))
+        return join_str.join(
+            p.zfill(3) if (p := str(i)).isdigit() else p for i in item_parts
+        )
 
     def _folder(self, item_id) -> str:
         return f"{self._folder_prefix}/{self._format_item_id(item_id)}/{self.time}"
@@ -74,10 +108,12 @@ class GenericItemPath(ItemPath):
 
 
 class DepItemPath(GenericItemPath):
-    pass
+    __slots__ = ()
 
 
 class S3ItemPath(GenericItemPath):
+    __slots__ = ("bucket",)
+
     def __init__(
         self,
         bucket: str,
@@ -100,6 +136,8 @@ class S3ItemPath(GenericItemPath):
 
 
 class LocalPath(DepItemPath):
+    __slots__ = ()
+
     def __init__(self, local_folder: str, prefix: str = "dep", **kwargs):
         super().__init__(**kwargs)
         self._folder_prefix = (
@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
+import warnings
 
+import numpy as np
 from xarray import DataArray, Dataset
 
 from .landsat_utils import mask_clouds as mask_clouds_landsat
@@ -22,12 +24,12 @@ class LandsatProcessor(Processor):
         send_area_to_processor: bool = False,
         scale_and_offset: bool = True,
         mask_clouds: bool = True,
-        mask_clouds_kwargs: dict = dict(),
+        mask_clouds_kwargs: dict | None = None,
     ) -> None:
         super().__init__(send_area_to_processor)
         self.scale_and_offset = scale_and_offset
         self.mask_clouds = mask_clouds
-        self.mask_kwargs = mask_clouds_kwargs
+        self.mask_kwargs = mask_clouds_kwargs if mask_clouds_kwargs is not None else {}
 
     def process(self, xr: DataArray | Dataset) -> DataArray | Dataset:
         if self.mask_clouds:
@@ -37,8 +39,10 @@ class LandsatProcessor(Processor):
             # These values only work for SR bands of landsat. Ideally we could
             # read from metadata. _Really_ ideally we could just pass "scale"
             # to rioxarray/stack/odc.stac.load but apparently that doesn't work.
-            scale = 0.0000275
-            offset = -0.2
+            # float32 is plenty for reflectances, and scaling integer
+            # data by a (float64) python float would double its size again
+            scale = np.float32(0.0000275)
+            offset = np.float32(-0.2)
 
             xr = scale_and_offset(xr, scale=[scale], offset=offset)
 
@@ -51,24 +55,26 @@ class S2Processor(Processor):
         send_area_to_processor: bool = False,
         scale_and_offset: bool = False,
         mask_clouds: bool = True,
-        mask_clouds_kwargs: dict = dict(),
+        mask_clouds_kwargs: dict | None = None,
     ) -> None:
         super().__init__(send_area_to_processor)
         self.scale_and_offset = scale_and_offset
         self.mask_clouds = mask_clouds
-        self.mask_clouds_kwargs = mask_clouds_kwargs
+        self.mask_clouds_kwargs = (
+            mask_clouds_kwargs if mask_clouds_kwargs is not None else {}
+        )
+        if self.scale_and_offset:
+            # Warn once here, rather than printing on every call to process
+            warnings.warn(
+                "scale and offset is dangerous when used without harmonize_to_old"
+            )
 
     def process(self, xr: DataArray) -> DataArray:
         if self.mask_clouds:
             xr = mask_clouds_s2(xr, **self.mask_clouds_kwargs)
 
-        if self.scale_and_offset and not self.harmonize_to_old:
-            print(
-                "Warning: scale and offset is dangerous when used without harmonize_to_old"
-            )
-
         if self.scale_and_offset:
-            scale = 1 / 10000
+            scale = np.float32(1 / 10000)
             offset = 0
             xr = scale_and_offset(xr, scale=[scale], offset=offset)
 
@@ -82,21 +88,22 @@ class XrPostProcessor(Processor):
         output_value_multiplier: int = 10000,
         scale_int16s: bool = False,
         output_nodata: int = -32767,
-        extra_attrs: dict = {},
+        extra_attrs: dict | None = None,
     ):
         self._convert_to_int16 = convert_to_int16
         self._output_value_multiplier = output_value_multiplier
         self._scale_int16s = scale_int16s
         self._output_nodata = output_nodata
-        self._extra_attrs = extra_attrs
+        self._extra_attrs = extra_attrs if extra_attrs is not None else {}
 
     def process(self, xr: DataArray | Dataset):
-        xr.attrs.update(self._extra_attrs)
-        if self._convert_to_int16:
-            xr = scale_to_int16(
-                xr,
-                output_multiplier=self._output_value_multiplier,
-                output_nodata=self._output_nodata,
-                scale_int16s=self._scale_int16s,
-            )
-        return xr
+        if self._extra_attrs:
+            xr.attrs.update(self._extra_attrs)
+        if not self._convert_to_int16:
+            return xr
+        return scale_to_int16(
+            xr,
+            output_multiplier=self._output_value_multiplier,
+            output_nodata=self._output_nodata,
+            scale_int16s=self._scale_int16s,
+        )
@@ -1,8 +1,33 @@
 import datetime
 from typing import Iterable, Tuple
 
+import numpy as np
 from odc.algo import erase_bad, mask_cleanup
-from xarray import DataArray, concat
+from xarray import DataArray, set_options
+
+# Scene classification (SCL) classes
+# NO_DATA = 0
+SATURATED_OR_DEFECTIVE = 1
+# DARK_AREA_PIXELS = 2
+CLOUD_SHADOWS = 3
+# VEGETATION = 4
+# NOT_VEGETATED = 5
+# WATER = 6
+# UNCLASSIFIED = 7
+CLOUD_MEDIUM_PROBABILITY = 8
+CLOUD_HIGH_PROBABILITY = 9
+THIN_CIRRUS = 10
+# SNOW = 11
+
+BAD_SCL_CLASSES = (
+    SATURATED_OR_DEFECTIVE,
+    CLOUD_SHADOWS,
+    CLOUD_MEDIUM_PROBABILITY,
+    CLOUD_HIGH_PROBABILITY,
+    THIN_CIRRUS,
+)
+# One bit per bad class, see mask_clouds
+_BAD_SCL_BITS = np.uint16(sum(1 << c for c in BAD_SCL_CLASSES))
 
 
 def mask_clouds(
@@ -11,28 +36,15 @@ def mask_clouds(
     keep_ints: bool = False,
     return_mask: bool = False,
 ) -> DataArray:
-    # NO_DATA = 0
-    SATURATED_OR_DEFECTIVE = 1
-    # DARK_AREA_PIXELS = 2
-    CLOUD_SHADOWS = 3
-    # VEGETATION = 4
-    # NOT_VEGETATED = 5
-    # WATER = 6
-    # UNCLASSIFIED = 7
-    CLOUD_MEDIUM_PROBABILITY = 8
-    CLOUD_HIGH_PROBABILITY = 9
-    THIN_CIRRUS = 10
-    # SNOW = 11
-
-    cloud_mask = xr.scl.isin(
-        [
-            SATURATED_OR_DEFECTIVE,
-            CLOUD_SHADOWS,
-            CLOUD_MEDIUM_PROBABILITY,
-            CLOUD_HIGH_PROBABILITY,
-            THIN_CIRRUS,
-        ]
-    )
+    if xr.scl.dtype.kind in "iu":
+        # Test every class at once by setting the bit for each pixel's class
+        # and checking it against the bad ones, which is much faster than
+        # isin. Classes of 16 or more shift out to 0, i.e. not bad.
+        cloud_mask = (
+            np.left_shift(np.uint16(1), xr.scl.astype("uint16")) & _BAD_SCL_BITS
+        ) != 0
+    else:
+        cloud_mask = xr.scl.isin(BAD_SCL_CLASSES)
 
     if filters is not None:
         cloud_mask = mask_cleanup(cloud_mask, filters)
@@ -73,38 +85,23 @@ def harmonize_to_old(data: DataArray) -> DataArray:
     if latest_datetime < CUTOFF:
         return data
 
-    # Check if the data has the band dimension
-    data_has_band_dim = "band" in data.dims
+    # Offset everything from the CUTOFF on, except the SCL band. Doing this
+    # with a mask rather than splitting and concatenating along time keeps
+    # the data's chunks as they are.
+    needs_offset = data.time >= np.datetime64(CUTOFF)
 
     # Handle the case where the data has the band dimension
-    if data_has_band_dim:
-        # Remove the bands dimension
-        data = data.to_dataset(dim="band").drop_dims("band")
-
-    # Store the old data, it doesn't need offsetting
-    old = data.sel(time=slice(CUTOFF))
-    # Get the data after the CUTOFF
-    new_unoffset = data.sel(time=slice(CUTOFF, None))
+    if "band" in data.dims:
+        needs_offset = needs_offset & (data.band != "SCL")
+        return _offset_where(data, needs_offset, OFFSET)
 
     # Handle SCL being there or not
-    new_scl = None
-    if "SCL" in new_unoffset:
-        new_scl = new_unoffset.SCL
-
-    new = new_unoffset.drop_vars("SCL", errors="ignore")
-
-    # Now clip to 1000, so any values lower than that are lost
-    # (otherwise we get integer overflows) and then offset
-    new = new.clip(OFFSET)
-    new -= OFFSET
-
-    # Combine with the SCL band if it was there
-    if new_scl is not None:
-        new["SCL"] = new_scl
-
-    out_data = concat([old, new], dim="time")
+    bands = data.drop_vars("SCL", errors="ignore")
+    return data.assign(_offset_where(bands, needs_offset, OFFSET).data_vars)
 
-    if data_has_band_dim:
-        out_data = out_data.to_array(dim="band")
 
-    return out_data
+def _offset_where(data, needs_offset, offset):
+    # Clip to the offset first, so any values lower than that are lost
+    # (otherwise we get integer overflows)
+    with set_options(keep_attrs=True):
+        return (data.clip(offset) - offset).where(needs_offset, data)
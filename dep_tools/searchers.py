@@ -1,14 +1,21 @@
 import warnings
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
 
-from geopandas import GeoDataFrame, read_file
+from geopandas import GeoDataFrame
 from odc.geo.geobox import GeoBox
 from pystac import ItemCollection
 from pystac_client import Client
 
 from dep_tools.exceptions import EmptyCollectionError
 from dep_tools.landsat_utils import items_in_pathrows, pathrows_in_area
-from dep_tools.utils import fix_bad_epsgs, remove_bad_items, search_across_180
+from dep_tools.utils import (
+    cached_search_across_180,
+    fix_and_remove_bad_items,
+    search_across_180,
+)
 
 
 class Searcher(ABC):
@@ -21,6 +28,30 @@ class Searcher(ABC):
     def search(self, area):
         pass
 
+    def search_iter(self, areas: Iterable, prefetch: int = 2) -> Iterator[tuple]:
+        """Search for each of the given areas, running up to `prefetch`
+        searches ahead in background threads so that search latency overlaps
+        with whatever the caller does with each result (e.g. loading).
+
+        Args:
+            areas: The areas to search, each as would be passed to :func:search.
+            prefetch: The maximum number of searches to have in flight.
+
+        Yields:
+            Tuples of (area, search result), in the same order as `areas`. Any
+            exception raised by a search is raised when its result is reached.
+        """
+        with ThreadPoolExecutor(max_workers=prefetch) as executor:
+            pending = deque()
+            for area in areas:
+                pending.append((area, executor.submit(self.search, area)))
+                if len(pending) >= prefetch:
+                    area, future = pending.popleft()
+                    yield area, future.result()
+            while pending:
+                area, future = pending.popleft()
+                yield area, future.result()
+
 
 class PystacSearcher(Searcher):
     """A Searcher which searches for stac items using pystac_client.Client.search.
@@ -39,6 +70,11 @@ class PystacSearcher(Searcher):
         client: A search client. Either this or catalog must be specified.
         raise_empty_collection_error: Whether an EmptyCollectionError exception
             should be returned if no stac items are found.
+        cache_results: Whether to reuse the results of identical earlier
+            searches (using :func:`dep_tools.utils.cached_search_across_180`).
+        cache_ttl_seconds: If caching results, how long they may be reused.
+            Defaults to a short time if the client signs item hrefs, and to
+            no limit otherwise.
         **kwargs: Additional arguments passed to client.search(). For example,
             passing `collections=["sentinel-2-l2a"]` will restrict results to
             Sentinel 2 stac items.
@@ -49,6 +85,8 @@ class PystacSearcher(Searcher):
         catalog: str | None = None,
         client: Client | None = None,
         raise_empty_collection_error: bool = True,
+        cache_results: bool = False,
+        cache_ttl_seconds: float | None = None,
         **kwargs,
     ):
         if client and catalog:
@@ -61,6 +99,8 @@ class PystacSearcher(Searcher):
 
         self._client = client if client else Client.open(catalog)
         self._raise_errors = raise_empty_collection_error
+        self._cache_results = cache_results
+        self._cache_ttl_seconds = cache_ttl_seconds
         self._kwargs = kwargs
 
     def search(self, area: GeoDataFrame | GeoBox) -> ItemCollection:
@@ -72,12 +112,22 @@ class PystacSearcher(Searcher):
         Returns:
             An ItemCollection.
         """
-        item_collection = search_across_180(
-            region=area, client=self._client, **self._kwargs
-        )
+        return self._search(area, **self._kwargs)
+
+    def _search(self, area: GeoDataFrame | GeoBox, **kwargs) -> ItemCollection:
+        if self._cache_results:
+            item_collection = cached_search_across_180(
+                region=area,
+                client=self._client,
+                cache_ttl_seconds=self._cache_ttl_seconds,
+                **kwargs,
+            )
+        else:
+            item_collection = search_across_180(
+                region=area, client=self._client, **kwargs
+            )
 
-        fix_bad_epsgs(item_collection)
-        item_collection = remove_bad_items(item_collection)
+        item_collection = fix_and_remove_bad_items(item_collection)
 
         if len(item_collection) == 0 and self._raise_errors:
             raise EmptyCollectionError()
@@ -130,7 +180,9 @@ class LandsatPystacSearcher(PystacSearcher):
         )
         self._kwargs["collections"] = collections
         self._search_intersecting_pathrows = search_intersecting_pathrows
-        self._exclude_platforms = exclude_platforms
+        self._exclude_platforms = (
+            frozenset(exclude_platforms) if exclude_platforms is not None else None
+        )
         self._only_tier_one = only_tier_one
         self._fall_back_to_tier_two = fall_back_to_tier_two
 
@@ -159,8 +211,20 @@ class LandsatPystacSearcher(PystacSearcher):
         search_area = (
             pathrows_in_area(area) if self._search_intersecting_pathrows else area
         )
+        kwargs = self._kwargs
+        if self._search_intersecting_pathrows:
+            # Let the server drop items outside the pathrows' paths and rows;
+            # items_in_pathrows below still matches exact path/row pairs.
+            query = dict(kwargs.get("query", {}))
+            query["landsat:wrs_path"] = {
+                "in": sorted({str(p).zfill(3) for p in search_area["PATH"]})
+            }
+            query["landsat:wrs_row"] = {
+                "in": sorted({str(r).zfill(3) for r in search_area["ROW"]})
+            }
+            kwargs = dict(kwargs, query=query)
         try:
-            items = super().search(search_area)
+            items = self._search(search_area, **kwargs)
         except EmptyCollectionError:
             # If we're only looking for tier one items, try falling back to both T1 and T2
             if self._only_tier_one and self._fall_back_to_tier_two:
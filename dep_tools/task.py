@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 from logging import Logger, getLogger
 
 from geopandas import GeoDataFrame
@@ -185,25 +186,47 @@ class MultiAreaTask:
         logger,
         task_class: type[AreaTask],
         fail_on_error: bool = True,
+        n_workers: int = 1,
         **kwargs,
     ):
+        """Run a task for each of the given ids, in turn or, if n_workers is
+        greater than one, that many at a time in threads. Loading and writing
+        are mostly waiting on the network, so running tasks concurrently
+        overlaps that waiting."""
         self.ids = ids
         self.areas = areas
         self.task_class = task_class
         self.fail_on_error = fail_on_error
+        self.n_workers = n_workers
         self.logger = logger
         self._kwargs = kwargs
 
     def run(self):
-        for id in self.ids:
-            try:
-                paths = self.task_class(id, self.areas.loc[[id]], **self._kwargs).run()
-                self.logger.info([id, "complete", paths])
-            except Exception as e:
-                if self.fail_on_error:
-                    raise e
-                self.logger.error([id, "error", [], e])
-                continue
+        if self.n_workers <= 1:
+            for id in self.ids:
+                self._run_one(id)
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.n_workers)
+        try:
+            futures = [executor.submit(self._run_one, id) for id in self.ids]
+            # Errors are only raised if fail_on_error is set. Stop at the
+            # first, whichever area it is in, rather than starting any more.
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in futures:
+                if future in done and future.exception() is not None:
+                    raise future.exception()
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def _run_one(self, id: TaskID):
+        try:
+            paths = self.task_class(id, self.areas.loc[[id]], **self._kwargs).run()
+            self.logger.info([id, "complete", paths])
+        except Exception as e:
+            if self.fail_on_error:
+                raise e
+            self.logger.error([id, "error", [], e])
 
 
 class SimpleLoggingAreaTask(AreaTask):
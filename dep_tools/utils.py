@@ -1,5 +1,11 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import json
 from logging import INFO, Formatter, Logger, StreamHandler, getLogger
 from pathlib import Path
+from threading import Lock
+from time import time
 from typing import Dict, List, Union
 
 from antimeridian import bbox as antimeridian_bbox
@@ -9,14 +15,16 @@ from antimeridian import (
     fix_line_string,
     fix_multi_line_string,
 )
-from geopandas import GeoDataFrame
+from geopandas import GeoDataFrame, GeoSeries
 import numpy as np
 from odc.geo.geobox import GeoBox as GeoBox
 from odc.geo.xr import write_cog
 import planetary_computer
-from pystac import ItemCollection
+from pystac import Item, ItemCollection
 import pystac_client
+from pyproj import CRS
 from retry import retry
+from shapely import Geometry
 from shapely.geometry import (
     LineString,
     MultiLineString,
@@ -70,51 +78,46 @@ def shift_negative_longitudes(
 BBOX = list[float]
 
 
+@lru_cache(maxsize=256)
+def _geographic_union(crs: CRS, wkbs: tuple[bytes, ...]) -> Geometry:
+    geometry = GeoSeries.from_wkb(list(wkbs), crs=crs).to_crs(4326)
+    geometry = geometry.make_valid().explode()
+    return geometry[geometry.geom_type.isin(["Polygon", "MultiPolygon"])].union_all()
+
+
 def bbox_across_180(region: GeoDataFrame | GeoBox) -> BBOX | tuple[BBOX, BBOX]:
     if isinstance(region, GeoBox):
         geometry = region.geographic_extent.geom
     else:
-        geometry = region.to_crs(4326).geometry.make_valid().explode()
-        geometry = geometry[
-            geometry.geom_type.isin(["Polygon", "MultiPolygon"])
-        ].union_all()
+        # The same areas are searched (and so reprojected) repeatedly, so
+        # the reprojected geometry is cached
+        geometry = _geographic_union(region.crs, tuple(region.geometry.to_wkb()))
 
     geometry = _fix_geometry(geometry)
-    bbox = antimeridian_bbox(geometry)
+    xmin, ymin, xmax, ymax = antimeridian_bbox(geometry)
     # Sometimes they still come through with the negative value first, see
     # https://github.com/gadomski/antimeridian/issues/134
-    if bbox[0] < 0 and bbox[2] > 0:
-        bbox[0], bbox[2] = bbox[2], bbox[0]
+    if xmin < 0 and xmax > 0:
+        xmin, xmax = xmax, xmin
 
     # Now fix some coord issues
     # If the lower left X coordinate is greater than 180 it needs to shift
-    if bbox[0] > 180:
-        bbox[0] = bbox[0] - 360
+    if xmin > 180:
+        xmin -= 360
         # If the upper right X coordinate is greater than 180 it needs to shift
         # but only if the lower left one did too... otherwise we split it below
-        if bbox[2] > 180:
-            bbox[2] = bbox[2] - 360
+        if xmax > 180:
+            xmax -= 360
 
     # These are Pacific specific tests, meaning e.g. we know that these aren't
     # areas that are crossing 0 longitude.
-    bbox_crosses_antimeridian = (bbox[0] > 0 and bbox[2] < 0) or (
-        bbox[0] < 180 and bbox[2] > 180
-    )
-
-    if bbox_crosses_antimeridian:
+    if (xmin > 0 and xmax < 0) or (xmin < 180 and xmax > 180):
         # Split into two bboxes across the antimeridian
-        xmin, ymin = bbox[0], bbox[1]
-        xmax, ymax = bbox[2], bbox[3]
+        if xmax > 180:
+            xmax -= 360
+        return (BBOX([xmin, ymin, 180, ymax]), BBOX([-180, ymin, xmax, ymax]))
 
-        xmax = xmax - 360 if xmax > 180 else xmax
-        left_bbox = BBOX([xmin, ymin, 180, ymax])
-        right_bbox = BBOX([-180, ymin, xmax, ymax])
-        return (left_bbox, right_bbox)
-    else:
-        return BBOX(bbox)
-
-
-from shapely import Geometry
+    return BBOX([xmin, ymin, xmax, ymax])
 
 
 def fix_winding(geom: Geometry) -> Geometry:
@@ -150,8 +153,6 @@ def _fix_geometry(geometry):
     return geometry
 
 
-# retry is for search timeouts which occasionally occur
-@retry(tries=5, delay=1)
 def search_across_180(
     region: GeoDataFrame | GeoBox, client: pystac_client.Client | None = None, **kwargs
 ) -> ItemCollection:
@@ -160,26 +161,113 @@ def search_across_180(
     **kwargs: Arguments besides bbox and intersects passed to
         pystac_client.Client.search
     """
+    return _search_bbox_across_180(bbox_across_180(region), client, **kwargs)
+
+
+# Keyed by (catalog, bbox, search arguments, ttl bucket); values are the
+# search results as dicts, so cached items can't be modified by callers
+_SEARCH_CACHE: OrderedDict[tuple, dict] = OrderedDict()
+_SEARCH_CACHE_LOCK = Lock()
+SEARCH_CACHE_SIZE = 512
+# Used when results are signed and no ttl is given, well within the expiry
+# of Planetary Computer SAS tokens
+SIGNED_SEARCH_CACHE_TTL_SECONDS = 15 * 60
+
+
+def cached_search_across_180(
+    region: GeoDataFrame | GeoBox,
+    client: pystac_client.Client | None = None,
+    cache_ttl_seconds: float | None = None,
+    **kwargs,
+) -> ItemCollection:
+    """As :func:`search_across_180`, but results are cached in memory
+    (for up to `SEARCH_CACHE_SIZE` searches) and reused for later
+    searches with the same catalog, bounding box (to six decimal places) and
+    arguments.
+
+    cache_ttl_seconds: If given, cached results are only reused for roughly
+        this many seconds. If not, and item hrefs are signed (as they are
+        for the default Planetary Computer client, or any client with a
+        modifier), `SIGNED_SEARCH_CACHE_TTL_SECONDS` is used, since
+        signatures expire. Must be greater than zero.
+    """
+    if cache_ttl_seconds is not None and cache_ttl_seconds <= 0:
+        raise ValueError("cache_ttl_seconds must be greater than zero")
+    if cache_ttl_seconds is None and (
+        client is None or getattr(client, "modifier", None) is not None
+    ):
+        cache_ttl_seconds = SIGNED_SEARCH_CACHE_TTL_SECONDS
+
+    bbox = bbox_across_180(region)
+    bboxes = bbox if isinstance(bbox, tuple) else (bbox,)
+    key = (
+        client.get_self_href() if client is not None else None,
+        tuple(tuple(round(coord, 6) for coord in b) for b in bboxes),
+        json.dumps(kwargs, sort_keys=True, default=str),
+        int(time() // cache_ttl_seconds) if cache_ttl_seconds is not None else None,
+    )
+
+    with _SEARCH_CACHE_LOCK:
+        cached = _SEARCH_CACHE.get(key)
+        if cached is not None:
+            _SEARCH_CACHE.move_to_end(key)
+
+    if cached is None:
+        cached = _search_bbox_across_180(bbox, client, **kwargs).to_dict()
+        with _SEARCH_CACHE_LOCK:
+            _SEARCH_CACHE[key] = cached
+            if len(_SEARCH_CACHE) > SEARCH_CACHE_SIZE:
+                _SEARCH_CACHE.popitem(last=False)
+
+    return ItemCollection.from_dict(cached)
+
+
+def _search_items(client: pystac_client.Client, **kwargs) -> list[Item]:
+    # Pages have to be requested one after another, so fetch the next page
+    # while the items in the current one are built
+    search = client.search(**kwargs)
+    pages = search.pages_as_dicts()
+    items = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_page = executor.submit(next, pages, None)
+        while (page := next_page.result()) is not None:
+            next_page = executor.submit(next, pages, None)
+            items.extend(
+                Item.from_dict(feature, root=search.client, preserve_dict=False)
+                for feature in page["features"]
+            )
+    return items
+
+
+# retry is for search timeouts which occasionally occur
+@retry(tries=5, delay=1)
+def _search_bbox_across_180(
+    bbox: BBOX | tuple[BBOX, BBOX],
+    client: pystac_client.Client | None = None,
+    **kwargs,
+) -> ItemCollection:
     if client is None:
         client = pystac_client.Client.open(
             "https://planetarycomputer.microsoft.com/api/stac/v1",
             modifier=planetary_computer.sign_inplace,
         )
 
-    bbox = bbox_across_180(region)
-
     if isinstance(bbox, tuple):
-        first_result = list(client.search(bbox=bbox[0], **kwargs).items())
-        first_ids = [item.id for item in first_result]
-
-        second_result = list(client.search(bbox=bbox[1], **kwargs).items())
+        # Run the searches on either side of the antimeridian concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first_result, second_result = executor.map(
+                lambda a_bbox: _search_items(client, bbox=a_bbox, **kwargs), bbox
+            )
+        first_ids = set(item.id for item in first_result)
         unique_second_result = [
             item for item in second_result if item.id not in first_ids
         ]
 
-        return ItemCollection(first_result + unique_second_result)
+        return ItemCollection(first_result + unique_second_result, clone_items=False)
     else:
-        return client.search(bbox=bbox, **kwargs).item_collection()
+        return ItemCollection(
+            _search_items(client, bbox=bbox, **kwargs), clone_items=False
+        )
 
 
 def copy_attrs(
@@ -205,7 +293,17 @@ def scale_and_offset(
     keep_attrs=True,
 ) -> DataArray | Dataset:
     """Apply the given scale and offset to the given Xarray object."""
-    output = da * scale + offset
+    # Skip whichever of the two operations would do nothing, each is a full
+    # pass over the data
+    output = da
+    if np.any(np.asarray(scale) != 1):
+        output = output * scale
+    if offset != 0:
+        output = output + offset
+    if output is da:
+        # Still return a new object, as the arithmetic would have, so
+        # callers can change it without changing `da`
+        return da.copy(deep=False)
     if keep_attrs:
         output = copy_attrs(da, output)
     return output
@@ -258,9 +356,13 @@ def scale_to_int16(
         if da.dtype not in int_types or scale_int16s:
             da = np.multiply(da, output_multiplier)
 
+        # Only floats can hold nans, and int16 data needs no cast, so skip
+        # those passes over the data when they'd do nothing
+        if da.dtype.kind == "f":
+            da = da.where(da.notnull(), output_nodata)
+
         return (
-            da.where(da.notnull(), output_nodata)
-            .astype("int16")
+            da.astype("int16", copy=False)
             .rio.write_nodata(output_nodata)  # for rioxarray
             .assign_attrs(nodata=output_nodata)  # for odc
         )
@@ -278,25 +380,12 @@ def scale_to_int16(
     return xr
 
 
-def fix_bad_epsgs(item_collection: ItemCollection) -> None:
-    """Repairs some band epsg codes in stac items loaded from the Planetary
-    Computer stac catalog"""
-    # ** modifies in place **
-    # See https://github.com/microsoft/PlanetaryComputer/discussions/113
-    # Will get fixed at some point and we can remove this
-    for item in item_collection:
-        if item.collection_id == "landsat-c2-l2":
-            epsg = str(item.properties["proj:epsg"])
-            item.properties["proj:epsg"] = int(f"{epsg[0:3]}{int(epsg[3:]):02d}")
-
-
-def remove_bad_items(item_collection: ItemCollection) -> ItemCollection:
-    """Remove really bad items which clobber processes even if `fail_on_error` is
-    set to False for odc.stac.load or the equivalent for stackstac.stack. The
-    first one here is a real file that is just an error in html.
-    See https://github.com/microsoft/PlanetaryComputer/discussions/101
-    """
-    bad_ids = [
+# Really bad items which clobber processes even if `fail_on_error` is set to
+# False for odc.stac.load or the equivalent for stackstac.stack. The first one
+# here is a real file that is just an error in html.
+# See https://github.com/microsoft/PlanetaryComputer/discussions/101
+BAD_ITEM_IDS = frozenset(
+    [
         "LC08_L2SR_081074_20220514_02_T1",
         "LC08_L2SP_101055_20220612_02_T2",
         "LC08_L2SR_074072_20221105_02_T1",
@@ -315,4 +404,42 @@ def remove_bad_items(item_collection: ItemCollection) -> ItemCollection:
         "LC09_L2SR_100051_20231107_02_T1",
         "LE07_L2SP_097065_20221029_02_T1",
     ]
-    return ItemCollection([i for i in item_collection if i.id not in bad_ids])
+)
+
+
+def _fix_bad_epsg(item: Item) -> None:
+    # See https://github.com/microsoft/PlanetaryComputer/discussions/113
+    # Will get fixed at some point and we can remove this
+    if item.collection_id == "landsat-c2-l2":
+        epsg = str(item.properties["proj:epsg"])
+        item.properties["proj:epsg"] = int(f"{epsg[0:3]}{int(epsg[3:]):02d}")
+
+
+def fix_bad_epsgs(item_collection: ItemCollection) -> None:
+    """Repairs some band epsg codes in stac items loaded from the Planetary
+    Computer stac catalog"""
+    # ** modifies in place **
+    for item in item_collection:
+        _fix_bad_epsg(item)
+
+
+def remove_bad_items(item_collection: ItemCollection) -> ItemCollection:
+    """Remove really bad items which clobber processes even if `fail_on_error` is
+    set to False for odc.stac.load or the equivalent for stackstac.stack. The
+    first one here is a real file that is just an error in html.
+    See https://github.com/microsoft/PlanetaryComputer/discussions/101
+    """
+    return ItemCollection(
+        [i for i in item_collection if i.id not in BAD_ITEM_IDS], clone_items=False
+    )
+
+
+def fix_and_remove_bad_items(item_collection: ItemCollection) -> ItemCollection:
+    """The equivalent of :func:`fix_bad_epsgs` followed by
+    :func:`remove_bad_items`, in a single pass over the items."""
+    items = []
+    for item in item_collection:
+        if item.id not in BAD_ITEM_IDS:
+            _fix_bad_epsg(item)
+            items.append(item)
+    return ItemCollection(items, clone_items=False)
@@ -1,7 +1,21 @@
+import boto3
 from geopandas import GeoDataFrame
 from shapely import box
 
-from dep_tools.aws import write_to_s3, object_exists
+from dep_tools.aws import _default_s3_client, write_to_s3, object_exists
+
+
+def test_default_s3_client_follows_default_session(monkeypatch):
+    # Restored after the test
+    monkeypatch.setattr(boto3, "DEFAULT_SESSION", None)
+
+    boto3.setup_default_session(region_name="ap-southeast-2")
+    client = _default_s3_client()
+    assert client.meta.region_name == "ap-southeast-2"
+    assert _default_s3_client() is client
+
+    boto3.setup_default_session(region_name="us-west-2")
+    assert _default_s3_client().meta.region_name == "us-west-2"
 
 
 # def test_write_to_s3_kwargs():
@@ -1,8 +1,11 @@
+from datetime import datetime
+
 import geopandas as gpd
+from pystac import Item
 import pytest
 from shapely.geometry import box
 
-from dep_tools.landsat_utils import pathrows_in_area
+from dep_tools.landsat_utils import items_in_pathrows, pathrows_in_area
 from dep_tools.searchers import LandsatPystacSearcher
 
 # From https://github.com/microsoft/PlanetaryComputer/issues/296
@@ -34,3 +37,19 @@ def test_search_for_stac_items_with_bad_geoms(near_antimeridian_area):
 
     items = searcher.search(near_antimeridian_area)
     assert len(items) == 12
+
+
+def test_items_in_pathrows():
+    def an_item(id, path, row):
+        properties = {"landsat:wrs_path": path, "landsat:wrs_row": row}
+        return Item(id, None, None, datetime(2022, 9, 1), properties)
+
+    items = [
+        an_item("a", "074", "072"),
+        an_item("b", "075", "072"),
+        an_item("c", "074", "072"),
+        an_item("d", "073", "072"),
+    ]
+    pathrows = gpd.GeoDataFrame(dict(PATH=[73, 74], ROW=[72, 72]))
+
+    assert [i.id for i in items_in_pathrows(items, pathrows)] == ["d", "a", "c"]
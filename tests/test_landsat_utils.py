@@ -0,0 +1,34 @@
+from geopandas import GeoDataFrame
+from shapely.geometry import box
+
+from dep_tools import landsat_utils
+
+
+def test_pathrows_cached_in_user_cache_dir_if_package_read_only(monkeypatch, tmp_path):
+    downloads = []
+
+    def fake_read_file(url):
+        downloads.append(url)
+        return GeoDataFrame(
+            dict(PATH=[1], ROW=[2]), geometry=[box(0, 0, 1, 1)], crs="EPSG:4326"
+        )
+
+    # A directory that can't be created, as it's already a file
+    read_only = tmp_path / "package"
+    read_only.touch()
+    cache_file = tmp_path / "cache" / "dep_tools" / "wrs2_descending.parquet"
+    monkeypatch.setattr(landsat_utils, "read_file", fake_read_file)
+    monkeypatch.setattr(landsat_utils, "WRS2_FILE", read_only / "wrs2.parquet")
+    monkeypatch.setattr(landsat_utils, "WRS2_CACHE_FILE", cache_file)
+    landsat_utils._pathrows.cache_clear()
+
+    try:
+        pathrows = landsat_utils._pathrows()
+        assert cache_file.exists()
+        assert list(tmp_path.glob("**/*.parquet")) == [cache_file]
+
+        landsat_utils._pathrows.cache_clear()
+        assert landsat_utils._pathrows().equals(pathrows)
+        assert len(downloads) == 1
+    finally:
+        landsat_utils._pathrows.cache_clear()
@@ -0,0 +1,300 @@
+from contextlib import nullcontext
+from datetime import datetime
+from types import SimpleNamespace
+
+from geopandas import GeoDataFrame
+import numpy as np
+from odc.geo.geobox import GeoBox
+from odc.geo.geom import Geometry
+from odc.geo.xr import xr_zeros
+from pystac import Asset, Item
+import pytest
+from shapely import unary_union
+from shapely.geometry import Polygon, box, mapping
+from xarray import DataArray, Dataset, concat
+
+from dep_tools.loaders import (
+    OdcLoader,
+    StackStacLoader,
+    _capped_chunks,
+    align_chunks,
+    nodata_mask,
+)
+
+
+def test_align_chunks_rounds_down_to_block_multiple():
+    chunks = align_chunks(dict(x=2000, y=700, time=1), (512, 512))
+    assert chunks == dict(x=1536, y=512, time=1)
+
+
+def test_align_chunks_at_least_one_block():
+    chunks = align_chunks(dict(x=100, y=100), (256, 512))
+    assert chunks == dict(x=512, y=256)
+
+
+def test_capped_chunks():
+    sizes = dict(time=1, y=10_000, x=10_000)
+    # 100 x 100 chunks of 100
+    chunks = _capped_chunks(dict(x=100, y=100), 10_000, sizes, 2_500)
+    assert chunks == dict(x=200, y=200)
+
+
+def test_capped_chunks_limited_to_size():
+    chunks = _capped_chunks(dict(x=100, y=100), 10_000, dict(y=150, x=150), 1)
+    assert chunks == dict(x=150, y=150)
+
+
+def test_capped_chunks_rounds_up_to_block_shape():
+    chunks = _capped_chunks(
+        dict(x=100, y=100), 10_000, dict(y=10_000, x=10_000), 2_500, (256, 512)
+    )
+    assert chunks == dict(x=512, y=256)
+
+
+def _item(day: int) -> Item:
+    item = Item(
+        f"item-{day}",
+        geometry=mapping(box(0, 0, 1, 1)),
+        bbox=[0, 0, 1, 1],
+        datetime=datetime(2020, 1, day),
+        properties={},
+        stac_extensions=[
+            "https://stac-extensions.github.io/projection/v1.1.0/schema.json"
+        ],
+    )
+    item.add_asset(
+        "red",
+        Asset(
+            "https://example.com/red.tif",
+            media_type="image/tiff; application=geotiff",
+            roles=["data"],
+            extra_fields={
+                "proj:epsg": 4326,
+                "proj:shape": [1000, 1000],
+                "proj:transform": [0.001, 0, 0, 0, -0.001, 1],
+            },
+        ),
+    )
+    return item
+
+
+def test_chunks_capped_before_loading(monkeypatch):
+    chunks_loaded = []
+
+    def fake_stac_load(items, **kwargs):
+        chunks_loaded.append(kwargs["chunks"])
+        return Dataset()
+
+    monkeypatch.setattr("dep_tools.loaders.stac_load", fake_stac_load)
+    # The output is in EPSG:4326, so has latitude and longitude dims
+    loader = OdcLoader(
+        chunks=dict(latitude=64, longitude=64),
+        align_chunks_to_blocks=(64, 64),
+        max_total_chunks=100,
+    )
+    area = GeoDataFrame(geometry=[box(0, 0, 1, 1)], crs="EPSG:4326")
+
+    with pytest.warns(UserWarning, match="768 dask chunks"):
+        loader.load([_item(1), _item(2), _item(3)], area)
+
+    # Loaded once, with chunks that are still multiples of the block shape
+    assert chunks_loaded == [dict(y=192, x=192)]
+
+
+def _aliased_item() -> Item:
+    item = _item(1)
+    item.stac_extensions.append(
+        "https://stac-extensions.github.io/eo/v1.1.0/schema.json"
+    )
+    red = item.assets.pop("red")
+    item.add_asset("visual", red.clone())
+    red.href = "https://example.com/B04.tif"
+    red.extra_fields["eo:bands"] = [dict(name="B04", common_name="red")]
+    item.add_asset("B04", red)
+    return item
+
+
+@pytest.mark.parametrize("bands", ["red", ["red"], "B04"])
+def test_block_shape_read_from_the_loaded_asset(monkeypatch, bands):
+    opened = []
+
+    def fake_open(href):
+        opened.append(href)
+        return nullcontext(SimpleNamespace(block_shapes=[(256, 256)]))
+
+    monkeypatch.setattr("dep_tools.loaders.rasterio.open", fake_open)
+    monkeypatch.setattr(
+        "dep_tools.loaders.stac_load", lambda items, **kwargs: Dataset()
+    )
+    loader = OdcLoader(
+        bands=bands, chunks=dict(x=1000, y=1000), align_chunks_to_blocks=True
+    )
+    area = GeoDataFrame(geometry=[box(0, 0, 1, 1)], crs="EPSG:4326")
+    loader.load([_aliased_item()], area)
+
+    assert opened == ["https://example.com/B04.tif"]
+
+
+def _fake_stac_load(monkeypatch) -> GeoBox:
+    geobox = GeoBox.from_bbox((0, 0, 100, 100), crs="EPSG:3857", resolution=1)
+
+    def fake_stac_load(items, **kwargs):
+        data = xr_zeros(geobox, dtype="uint16") + np.uint16(1)
+        data[:10] = 0
+        data.attrs["nodata"] = 0
+        return Dataset(dict(red=data, green=data.copy()))
+
+    monkeypatch.setattr("dep_tools.loaders.stac_load", fake_stac_load)
+    return geobox
+
+
+def _triangle(geobox: GeoBox) -> GeoDataFrame:
+    return GeoDataFrame(
+        geometry=[Polygon([(0, 0), (100, 0), (0, 100)])], crs=geobox.crs.to_wkt()
+    )
+
+
+def test_load_return_mask_with_clip_to_area(monkeypatch):
+    geobox = _fake_stac_load(monkeypatch)
+    area = _triangle(geobox)
+    loader = OdcLoader(clip_to_area=True, load_as_dataset=False)
+
+    data, mask = loader.load([], area, return_mask=True)
+    assert data.dtype == np.uint16
+    assert mask.dtype == bool
+
+    clipped = OdcLoader(clip_to_area=True, load_as_dataset=False).load([], area)
+    valid = clipped.notnull() & (clipped != 0)
+    assert (mask == valid).all()
+    assert not mask.all()
+    assert mask.any()
+
+
+def test_nodata_mask_treats_nan_as_invalid_for_floats():
+    da = DataArray(np.array([0.0, 1.0, np.nan]), dims="x", attrs=dict(nodata=0))
+    assert nodata_mask(da).values.tolist() == [False, True, False]
+
+
+def test_load_many_matches_load(monkeypatch):
+    geobox = _fake_stac_load(monkeypatch)
+    area = _triangle(geobox)
+    for clip_to_area in [False, True]:
+        loader = OdcLoader(clip_to_area=clip_to_area, load_as_dataset=False)
+        [many] = loader.load_many([[]], [area])
+        assert many.identical(loader.load([], area))
+
+        [(data, mask)] = loader.load_many([[]], [area], return_mask=True)
+        one_data, one_mask = loader.load([], area, return_mask=True)
+        assert data.identical(one_data)
+        assert mask.identical(one_mask)
+
+
+def test_load_many_keeps_each_areas_items(monkeypatch):
+    geobox = GeoBox.from_bbox((0, 0, 100, 100), crs="EPSG:3857", resolution=1)
+    calls = []
+
+    def fake_stac_load(items, **kwargs):
+        calls.append(sorted(item.id for item in items))
+        # odc.stac.load sorts by time
+        items = sorted(items, key=lambda item: item.datetime)
+        data = concat(
+            [
+                xr_zeros(geobox, dtype="uint16") + np.uint16(item.value)
+                for item in items
+            ],
+            dim="time",
+        ).assign_coords(time=[item.datetime for item in items])
+        data.attrs["nodata"] = 0
+        area = kwargs["geopolygon"]
+        if isinstance(area, GeoDataFrame):
+            area = Geometry(unary_union(area.geometry.values), crs=area.crs)
+        return Dataset(dict(red=data)).odc.crop(area, apply_mask=False)
+
+    monkeypatch.setattr("dep_tools.loaders.stac_load", fake_stac_load)
+    a = SimpleNamespace(id="a", datetime=np.datetime64("2020-01-01"), value=1)
+    b = SimpleNamespace(id="b", datetime=np.datetime64("2020-01-02"), value=2)
+    left = GeoDataFrame(geometry=[box(0, 0, 50, 100)], crs=geobox.crs.to_wkt())
+    right = GeoDataFrame(geometry=[box(50, 0, 100, 100)], crs=geobox.crs.to_wkt())
+    items_per_area = [[a], [a, b], [b, a]]
+    areas = [left, right, left]
+
+    loader = OdcLoader(load_as_dataset=False)
+    many = loader.load_many(items_per_area, areas)
+
+    # One load per distinct set of items
+    assert calls == [["a"], ["a", "b"]]
+    assert many[0].sizes["time"] == 1
+    for output, items, area in zip(many, items_per_area, areas):
+        assert output.identical(loader.load(items, area))
+
+
+def _fake_stack(monkeypatch) -> list:
+    """Replaces stackstac's stack with a fake and returns the stacks made."""
+    stacks = []
+
+    def fake_stack(items, chunksize, epsg, bounds, resolution, **kwargs):
+        geobox = GeoBox.from_bbox(bounds, crs=epsg, resolution=resolution)
+        data = xr_zeros(geobox, dtype="uint16", chunks=chunksize).drop_vars(
+            "spatial_ref"
+        ) + np.uint16(1)
+        data.attrs["nodata"] = 0
+        stacks.append(data)
+        return data.expand_dims(time=len(items), band=1)
+
+    monkeypatch.setattr("dep_tools.loaders.stack", fake_stack)
+    return stacks
+
+
+def _stack_stac_loader(**kwargs) -> StackStacLoader:
+    loader = StackStacLoader(stack_kwargs=dict(resolution=1), **kwargs)
+    loader._current_epsg = 3857
+    loader.dask_chunksize = (50, 50)
+    return loader
+
+
+def test_stack_stac_load_rectangular_area(monkeypatch):
+    _fake_stack(monkeypatch)
+    area = GeoDataFrame(geometry=[box(0, 0, 100, 50)], crs="EPSG:3857")
+
+    data = _stack_stac_loader().load([_item(1)], area)
+
+    assert data.sizes["y"] == 50
+    assert data.sizes["x"] == 100
+    assert data.dtype == np.uint16
+    assert (data == 1).all()
+
+
+def test_stack_stac_load_clips_to_area(monkeypatch):
+    _fake_stack(monkeypatch)
+    area = _triangle(GeoBox.from_bbox((0, 0, 100, 100), crs=3857, resolution=1))
+
+    data = _stack_stac_loader().load([_item(1)], area)
+
+    # Trimmed to the area, with pixels outside it set to nodata
+    assert data.sizes["y"] == 100
+    assert data.sizes["x"] == 100
+    assert data.dtype == np.uint16
+    assert data.attrs["nodata"] == 0
+    data = data.compute()
+    assert data.isel(y=-1, x=0).item() == 1
+    assert data.isel(y=0, x=-1).item() == 0
+    assert (data == 0).any()
+
+
+def test_stack_stac_share_identical_loads(monkeypatch):
+    stacks = _fake_stack(monkeypatch)
+    area = GeoDataFrame(geometry=[box(0, 0, 100, 100)], crs="EPSG:3857")
+    other_area = GeoDataFrame(geometry=[box(0, 0, 50, 50)], crs="EPSG:3857")
+    loader = _stack_stac_loader(share_identical_loads=True)
+
+    first = loader.load([_item(1)], area)
+    assert loader.load([_item(1)], area) is first
+    assert len(stacks) == 1
+
+    assert loader.load([_item(1)], other_area) is not first
+    assert loader.load([_item(2)], area) is not first
+    assert len(stacks) == 3
+
+    # Without sharing, every load is separate
+    loader = _stack_stac_loader()
+    assert loader.load([_item(1)], area) is not loader.load([_item(1)], area)
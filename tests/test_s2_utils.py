@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from xarray import DataArray, Dataset
+
+from dep_tools.s2_utils import BAD_SCL_CLASSES, harmonize_to_old, mask_clouds
+
+# Either side of and on the 2022-01-25 baseline change
+TIMES = np.array(["2022-01-24", "2022-01-25", "2022-01-26"], dtype="M8[ns]")
+
+
+def _band(values, times=TIMES) -> DataArray:
+    return DataArray(
+        np.array(values, dtype="uint16").reshape(len(times), 1, 1),
+        dims=["time", "y", "x"],
+        coords=dict(time=times),
+        attrs=dict(nodata=0),
+    )
+
+
+def test_harmonize_to_old_dataset():
+    ds = Dataset(dict(red=_band([1500, 1500, 1500]), scl=_band([9, 9, 9]))).rename(
+        scl="SCL"
+    )
+    ds = ds.chunk(time=1)
+
+    harmonized = harmonize_to_old(ds)
+
+    np.testing.assert_array_equal(harmonized.red.values.ravel(), [1500, 500, 500])
+    np.testing.assert_array_equal(harmonized.SCL.values.ravel(), [9, 9, 9])
+    assert harmonized.red.dtype == ds.red.dtype
+    assert harmonized.red.chunks == ds.red.chunks
+    assert harmonized.red.attrs == ds.red.attrs
+
+
+def test_harmonize_to_old_data_array_with_band_dim():
+    da = Dataset(dict(red=_band([1500, 1500, 900]), SCL=_band([9, 9, 9]))).to_array(
+        "band"
+    )
+
+    harmonized = harmonize_to_old(da)
+
+    # Values below the offset become zero
+    np.testing.assert_array_equal(
+        harmonized.sel(band="red").values.ravel(), [1500, 500, 0]
+    )
+    np.testing.assert_array_equal(harmonized.sel(band="SCL").values.ravel(), [9, 9, 9])
+    assert harmonized.dtype == da.dtype
+
+
+@pytest.mark.parametrize("as_dataset", [True, False])
+def test_harmonize_to_old_before_cutoff(as_dataset):
+    data = _band([1500, 1500], TIMES[:1].repeat(2))
+    if as_dataset:
+        data = data.to_dataset(name="red")
+
+    assert harmonize_to_old(data) is data
+
+
+@pytest.mark.parametrize("dtype", ["uint8", "int16", "float32"])
+def test_mask_clouds_matches_isin(dtype):
+    scl = np.arange(256).astype(dtype)
+    if dtype == "int16":
+        scl = np.append(scl, -1)
+    if dtype == "float32":
+        scl = np.append(scl, np.nan)
+    ds = Dataset(dict(scl=DataArray(scl, dims=["x"])))
+
+    _, mask = mask_clouds(ds, return_mask=True)
+
+    np.testing.assert_array_equal(mask.values, np.isin(scl, BAD_SCL_CLASSES))
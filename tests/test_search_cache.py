@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from datetime import datetime
+
+from geopandas import GeoDataFrame
+from pystac import Item, ItemCollection
+import pytest
+from shapely.geometry import box, mapping
+
+from dep_tools import utils
+from dep_tools.utils import SIGNED_SEARCH_CACHE_TTL_SECONDS, cached_search_across_180
+
+AREA = GeoDataFrame(geometry=[box(178, -18, 179, -17)], crs="EPSG:4326")
+
+
+class FakeClient:
+    def __init__(self, href="https://example.com/stac", modifier=None):
+        self.href = href
+        self.modifier = modifier
+
+    def get_self_href(self):
+        return self.href
+
+
+@pytest.fixture
+def searches(monkeypatch) -> list:
+    """Replaces the search with a fake and returns the searches made."""
+    searches = []
+
+    def fake_search(bbox, client, **kwargs):
+        searches.append((client.get_self_href(), kwargs))
+        item = Item(
+            "item",
+            geometry=mapping(box(*bbox)),
+            bbox=list(bbox),
+            datetime=datetime(2020, 1, 1),
+            properties={},
+        )
+        return ItemCollection([item])
+
+    monkeypatch.setattr(utils, "_SEARCH_CACHE", OrderedDict())
+    monkeypatch.setattr(utils, "_search_bbox_across_180", fake_search)
+    return searches
+
+
+def _at(monkeypatch, seconds: float):
+    monkeypatch.setattr(utils, "time", lambda: seconds)
+
+
+def test_cached_search_key(searches):
+    client = FakeClient()
+    cached_search_across_180(AREA, client, collections=["a"])
+    cached_search_across_180(AREA, client, collections=["a"])
+    assert len(searches) == 1
+
+    # Differences past the sixth decimal place don't matter
+    nudged = AREA.set_geometry(AREA.translate(1e-8))
+    cached_search_across_180(nudged, client, collections=["a"])
+    assert len(searches) == 1
+
+    cached_search_across_180(AREA, client, collections=["b"])
+    cached_search_across_180(AREA, FakeClient("https://example.com/other"))
+    assert len(searches) == 3
+
+
+def test_cached_search_ttl(searches, monkeypatch):
+    client = FakeClient()
+    _at(monkeypatch, 0)
+    cached_search_across_180(AREA, client, cache_ttl_seconds=60)
+    _at(monkeypatch, 59)
+    cached_search_across_180(AREA, client, cache_ttl_seconds=60)
+    assert len(searches) == 1
+
+    _at(monkeypatch, 61)
+    cached_search_across_180(AREA, client, cache_ttl_seconds=60)
+    assert len(searches) == 2
+
+
+def test_cached_search_without_ttl_never_expires(searches, monkeypatch):
+    client = FakeClient()
+    _at(monkeypatch, 0)
+    cached_search_across_180(AREA, client)
+    _at(monkeypatch, 10 * SIGNED_SEARCH_CACHE_TTL_SECONDS)
+    cached_search_across_180(AREA, client)
+    assert len(searches) == 1
+
+
+def test_cached_search_signed_results_expire_by_default(searches, monkeypatch):
+    client = FakeClient(modifier=lambda results: results)
+    _at(monkeypatch, 0)
+    cached_search_across_180(AREA, client)
+    _at(monkeypatch, SIGNED_SEARCH_CACHE_TTL_SECONDS - 1)
+    cached_search_across_180(AREA, client)
+    assert len(searches) == 1
+
+    _at(monkeypatch, SIGNED_SEARCH_CACHE_TTL_SECONDS + 1)
+    cached_search_across_180(AREA, client)
+    assert len(searches) == 2
+
+
+def test_cached_search_returns_independent_copies(searches):
+    client = FakeClient()
+    first = cached_search_across_180(AREA, client)
+    first.items[0].properties["changed"] = True
+
+    second = cached_search_across_180(AREA, client)
+    assert len(searches) == 1
+    assert "changed" not in second.items[0].properties
+
+
+@pytest.mark.parametrize("ttl", [0, -1])
+def test_cached_search_ttl_must_be_positive(searches, ttl):
+    with pytest.raises(ValueError):
+        cached_search_across_180(AREA, FakeClient(), cache_ttl_seconds=ttl)
+    assert len(searches) == 0
@@ -6,7 +6,7 @@ import pytest
 from shapely.geometry import box
 from xarray import Dataset
 
-from dep_tools.searchers import PystacSearcher, LandsatPystacSearcher
+from dep_tools.searchers import PystacSearcher, LandsatPystacSearcher, Searcher
 
 BBOX = [-111, 35, -110, 36]
 
@@ -50,3 +50,12 @@ def test_unsigned_search(area, mspc_catalog):
     items = s.search(area)
     ds = odc.stac.load([items[0]], patch_url=pc.sign, chunks=dict(x=2048, y=2048))
     assert isinstance(ds, Dataset)
+
+
+def test_search_iter_preserves_order():
+    class DoublingSearcher(Searcher):
+        def search(self, area):
+            return area * 2
+
+    results = list(DoublingSearcher().search_iter(range(5), prefetch=2))
+    assert results == [(i, i * 2) for i in range(5)]
@@ -0,0 +1,37 @@
+from logging import getLogger
+from time import sleep
+
+from geopandas import GeoDataFrame
+import pytest
+from shapely.geometry import box
+
+from dep_tools.task import MultiAreaTask
+
+
+def test_multi_area_task_stops_after_an_error():
+    ids = ["a", "b", "c", "d", "e", "f"]
+    areas = GeoDataFrame(
+        geometry=[box(0, 0, 1, 1)] * len(ids), index=ids, crs="EPSG:4326"
+    )
+    started = []
+
+    class FakeTask:
+        def __init__(self, id, area):
+            self.id = id
+
+        def run(self):
+            started.append(self.id)
+            if self.id == "b":
+                raise ValueError("b failed")
+            sleep(0.5 if self.id == "a" else 0.1)
+            return []
+
+    task = MultiAreaTask(
+        ids, areas, getLogger(__name__), FakeTask, fail_on_error=True, n_workers=2
+    )
+    with pytest.raises(ValueError, match="b failed"):
+        task.run()
+
+    # The slow first area finishes, but the queued ones aren't started (bar
+    # one the free worker may pick up before the error is seen)
+    assert set(started) <= {"a", "b", "c"}